@@ -1,13 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import requests, json, os
+import requests, json, os, threading
 from datetime import datetime
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from PIL import Image, ImageTk
+from requests.adapters import HTTPAdapter
 
 API_URL = "http://127.0.0.1:8000/recommend"
 
+# Sesión persistente: reutiliza la conexión (keep-alive) entre consultas
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=4))
+
 class ModernUI(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -16,6 +21,10 @@ class ModernUI(tk.Tk):
         self.configure(bg="#0e0e0e")
         self.minsize(900, 700)
         self._create_style()
+        img_path = os.path.join(os.path.dirname(__file__), "presupuesto.jpg")
+        self._budget_img = None
+        if os.path.exists(img_path):
+            self._budget_img = ImageTk.PhotoImage(Image.open(img_path).resize((400, 300)))
         self._build_interface()
 
     def _create_style(self):
@@ -55,8 +64,9 @@ class ModernUI(tk.Tk):
 
         btn_frame = tk.Frame(self, bg="#0e0e0e")
         btn_frame.pack(fill="x", pady=5)
-        tk.Button(btn_frame, text="🔍 Generar Recomendación", bg="#00ADEF", fg="white",
-                  font=("Segoe UI", 11, "bold"), relief="flat", command=self.get_recommendation).pack(side="left", expand=True, padx=20)
+        self.generate_btn = tk.Button(btn_frame, text="🔍 Generar Recomendación", bg="#00ADEF", fg="white",
+                                      font=("Segoe UI", 11, "bold"), relief="flat", command=self.get_recommendation)
+        self.generate_btn.pack(side="left", expand=True, padx=20)
 
         content_frame = tk.Frame(self, bg="#0e0e0e")
         content_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -70,6 +80,17 @@ class ModernUI(tk.Tk):
         self.chart_frame = tk.Frame(content_frame, bg="#0e0e0e")
         self.chart_frame.grid(row=0, column=1, sticky="nsew")
 
+        # Figura y canvas se crean una sola vez; cada consulta solo redibuja los ejes
+        self._fig = Figure(figsize=(4, 3), facecolor="#0e0e0e")
+        self._ax = self._fig.add_subplot(111)
+        self._canvas = FigureCanvasTkAgg(self._fig, master=self.chart_frame)
+        self._canvas_widget = self._canvas.get_tk_widget()
+        if self._budget_img:
+            self.budget_label = tk.Label(self.chart_frame, image=self._budget_img, bg="#0e0e0e")
+        else:
+            self.budget_label = tk.Label(self.chart_frame, text="(No se encontró la imagen 'presupuesto.jpg')",
+                                         bg="#0e0e0e", fg="gray")
+
         self.note_label = tk.Label(self, bg="#0e0e0e", fg="#00C6FF", font=("Segoe UI", 10, "italic"))
         self.note_label.pack(pady=(0, 10))
 
@@ -81,14 +102,27 @@ class ModernUI(tk.Tk):
             messagebox.showerror("Error", "⚠️ El presupuesto debe ser numérico.")
             return
         payload = {"profile": self.profile_cb.get(), "budget": budget_value}
+        self.generate_btn.config(state="disabled")
+        threading.Thread(target=self._fetch, args=(payload,), daemon=True).start()
+
+    def _fetch(self, payload):
+        # Corre fuera del hilo de Tk; los resultados se regresan con self.after
         try:
-            res = requests.post(API_URL, json=payload)
+            res = SESSION.post(API_URL, json=payload, timeout=5)
             if res.status_code == 200:
-                self.show_result(res.json())
+                self.after(0, self._on_result, res.json())
             else:
-                messagebox.showerror("Error API", f"Código {res.status_code}")
+                self.after(0, self._show_error, "Error API", f"Código {res.status_code}")
         except Exception as e:
-            messagebox.showerror("Error", str(e))
+            self.after(0, self._show_error, "Error", str(e))
+
+    def _on_result(self, data):
+        self.generate_btn.config(state="normal")
+        self.show_result(data)
+
+    def _show_error(self, title, message):
+        self.generate_btn.config(state="normal")
+        messagebox.showerror(title, message)
 
     # ------------------- Mostrar resultado -------------------
     def show_result(self, data):
@@ -103,16 +137,8 @@ class ModernUI(tk.Tk):
                 self.result_box.insert(tk.END, f"🔍 Info técnica:\n{json.dumps(data['debug'], indent=2)}\n")
 
             self.note_label.config(text="")
-            for w in self.chart_frame.winfo_children():
-                w.destroy()
-            img_path = os.path.join(os.path.dirname(__file__), "presupuesto.jpg")
-            if os.path.exists(img_path):
-                img = Image.open(img_path).resize((400, 300))
-                self.img_tk = ImageTk.PhotoImage(img)
-                tk.Label(self.chart_frame, image=self.img_tk, bg="#0e0e0e").pack(expand=True)
-            else:
-                tk.Label(self.chart_frame, text="(No se encontró la imagen 'presupuesto.jpg')",
-                         bg="#0e0e0e", fg="gray").pack(expand=True)
+            self._canvas_widget.pack_forget()
+            self.budget_label.pack(expand=True)
             return
 
         # Resultado normal
@@ -130,17 +156,14 @@ class ModernUI(tk.Tk):
         self._show_chart(data["allocation_estimate"])
 
     def _show_chart(self, allocation):
-        for w in self.chart_frame.winfo_children():
-            w.destroy()
+        self.budget_label.pack_forget()
         labels, values = list(allocation.keys()), list(allocation.values())
-        fig = Figure(figsize=(4, 3), facecolor="#0e0e0e")
-        ax = fig.add_subplot(111)
-        ax.pie(values, labels=labels, autopct="%1.0f%%", startangle=140,
-               colors=["#00C6FF", "#00ADEF", "#3399FF", "#66B2FF"], textprops={'color': "white"})
-        ax.set_title("Distribución del presupuesto", color="white")
-        canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
+        self._ax.clear()
+        self._ax.pie(values, labels=labels, autopct="%1.0f%%", startangle=140,
+                     colors=["#00C6FF", "#00ADEF", "#3399FF", "#66B2FF"], textprops={'color': "white"})
+        self._ax.set_title("Distribución del presupuesto", color="white")
+        self._canvas_widget.pack(fill="both", expand=True)
+        self._canvas.draw_idle()
 
     def use_suggested_budget(self):
         if hasattr(self, "last_min_budget"):
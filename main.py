@@ -7,20 +7,44 @@
 # configuración de hardware posible.
 # -------------------------------------------------------------
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from pydantic import BaseModel
-import json, random, traceback
+import random, traceback, hashlib, functools
+import orjson
+from bisect import bisect_right
+from collections import defaultdict
 from pathlib import Path
 from typing import Optional
+from operator import itemgetter
 
 # -------------------- CARGA DE BASE DE CONOCIMIENTO --------------------
 DATA_PATH = Path(__file__).parent / "base_knowledge.json"
 
-try:
-    with open(DATA_PATH, "r", encoding="utf-8") as f:
-        knowledge = json.load(f)
-except Exception as e:
-    raise RuntimeError(f"Error al cargar la base de conocimiento: {e}")
+# Único campo opcional del catálogo; price y performance_score son obligatorios
+# y una entrada sin ellos debe fallar al cargar.
+COMPONENT_DEFAULTS = {
+    "gpus": {"power_w": 100},
+}
+
+@functools.cache
+def load_knowledge():
+    """Lee y normaliza la base de conocimiento una sola vez por proceso.
+
+    Devuelve también un hash del archivo, que versiona los ETag del catálogo.
+    """
+    try:
+        raw = DATA_PATH.read_bytes()
+        data = orjson.loads(raw)
+    except Exception as e:
+        raise RuntimeError(f"Error al cargar la base de conocimiento: {e}")
+
+    for key, defaults in COMPONENT_DEFAULTS.items():
+        for comp in data["components"][key]:
+            for field, value in defaults.items():
+                comp.setdefault(field, value)
+    return data, hashlib.md5(raw).hexdigest()[:12]
+
+knowledge, KB_DIGEST = load_knowledge()
 
 # -------------------- DEFINICIÓN DE LA API --------------------
 app = FastAPI(title="Motor de Inferencia - Sistema Experto en Hardware", version="3.0")
@@ -29,59 +53,87 @@ class UserRequest(BaseModel):
     profile: Optional[str] = ""
     budget: float
 
-# -------------------- MOTOR DE INFERENCIA --------------------
-class InferenceEngine:
-    def __init__(self, knowledge):
-        self.knowledge = knowledge
-        self.facts = {}
-        self.rules = []
+# -------------------- ÍNDICES PRECALCULADOS --------------------
+# La base de conocimiento es estática: los filtros y ordenamientos que no
+# dependen del presupuesto se calculan una sola vez al cargarla.
+by_price = itemgetter("price")
 
-    def add_fact(self, key, value):
-        self.facts[key] = value
+def build_price_index(components):
+    """Ordena por precio y guarda, para cada prefijo, el componente de mayor rendimiento."""
+    ordered = sorted(components, key=by_price)
+    prices, best, top = [], [], None
+    for c in ordered:
+        if top is None or (c["performance_score"], -c["price"]) > (top["performance_score"], -top["price"]):
+            top = c
+        prices.append(c["price"])
+        best.append(top)
+    # Arreglos paralelos (precio / mejor candidato) en tuplas inmutables
+    return {"ordered": tuple(ordered), "prices": tuple(prices), "best": tuple(best)}
 
-    def add_rule(self, condition_fn, action_fn, name=""):
-        self.rules.append({"condition": condition_fn, "action": action_fn, "name": name})
+def build_kb_index(knowledge):
+    comps = knowledge["components"]
+    profiles = knowledge["profiles"]
 
-    def infer(self):
-        applied = True
-        while applied:
-            applied = False
-            for rule in self.rules:
-                if rule["condition"](self.facts) and not self.facts.get(f"_applied_{rule['name']}", False):
-                    rule["action"](self.facts)
-                    self.facts[f"_applied_{rule['name']}"] = True
-                    applied = True
-        return self.facts
+    mobo_by_socket = defaultdict(list)
+    for m in comps["motherboards"]:
+        mobo_by_socket[m["socket"]].append(m)
+
+    ram_sizes = {p["min_ram_gb"] for p in profiles.values()}
+    ssd_sizes = {p["min_ssd_gb"] for p in profiles.values()}
+    monitors = comps["monitors"]
+
+    return {
+        "cpus_sorted": build_price_index(comps["cpus"]),
+        "gpus_sorted": build_price_index(comps["gpus"]),
+        "rams_by_min_gb": {n: build_price_index([r for r in comps["rams"] if r["size_gb"] >= n]) for n in ram_sizes},
+        "ssds_by_min_gb": {n: build_price_index([s for s in comps["ssds"] if s["size_gb"] >= n]) for n in ssd_sizes},
+        "mobo_by_socket": dict(mobo_by_socket),
+        "monitors_by_profile": {
+            "gamer": [m for m in monitors if m["hz"] >= 120] or monitors,
+            "disenador": [m for m in monitors if m["res"] in ["1440p", "4K"]] or monitors,
+        },
+        "integrated_gpu": next((g for g in comps["gpus"] if g["level"] == "integrated"), comps["gpus"][0]),
+    }
+
+KB_INDEX = build_kb_index(knowledge)
+
+# Costo mínimo de una PC completa (la GPU integrada no suma precio)
+BASE_KEYS = ("cpus", "rams", "ssds", "psus", "motherboards", "monitors")
+CHEAPEST = {key: min(knowledge["components"][key], key=by_price) for key in BASE_KEYS}
+MIN_BASE = sum(c["price"] for c in CHEAPEST.values())
+
+# Respuesta de rechazo por presupuesto insuficiente (solo cambia budget_input)
+LOW_BUDGET_ERROR = {
+    "error": "Presupuesto insuficiente para armar una PC completa.",
+    "minimum_required": MIN_BASE,
+    "debug": {key: {"name": c["name"], "price": c["price"]} for key, c in CHEAPEST.items()}
+}
 
 # -------------------- FUNCIONES AUXILIARES --------------------
-def choose_best(components, max_budget, percent):
+def choose_best(index, max_budget, percent):
     max_price = max_budget * percent * 1.15
-    valid = [c for c in components if c["price"] <= max_price]
-    if not valid:
-        return min(components, key=lambda c: c["price"])
-    valid.sort(key=lambda x: (x["performance_score"], -x["price"]), reverse=True)
-    return valid[0]
-
-def choose_mobo(mobos, cpu):
-    same = [m for m in mobos if m["socket"] == cpu["socket"]]
-    return random.choice(same or mobos)
-
-def choose_ram_and_ssd(rams, ssds, profile_info, budget, ram_p, ssd_p):
-    ram = choose_best([r for r in rams if r["size_gb"] >= profile_info["min_ram_gb"]], budget, ram_p)
-    ssd = choose_best([s for s in ssds if s["size_gb"] >= profile_info["min_ssd_gb"]], budget, ssd_p)
+    i = bisect_right(index["prices"], max_price)
+    if not i:
+        return index["ordered"][0]
+    return index["best"][i - 1]
+
+def choose_mobo(mobos, cpu, rng):
+    same = KB_INDEX["mobo_by_socket"].get(cpu["socket"]) or mobos
+    return same[rng.randrange(len(same))]
+
+def choose_ram_and_ssd(profile_info, budget, ram_p, ssd_p):
+    ram = choose_best(KB_INDEX["rams_by_min_gb"][profile_info["min_ram_gb"]], budget, ram_p)
+    ssd = choose_best(KB_INDEX["ssds_by_min_gb"][profile_info["min_ssd_gb"]], budget, ssd_p)
     return ram, ssd
 
-def choose_monitor(monitors, profile, budget):
-    if profile == "gamer":
-        filt = [m for m in monitors if m["hz"] >= 120]
-        return random.choice(filt or monitors)
-    if profile == "disenador":
-        filt = [m for m in monitors if m["res"] in ["1440p", "4K"]]
-        return random.choice(filt or monitors)
+def choose_monitor(monitors, profile, budget, rng):
+    if profile in KB_INDEX["monitors_by_profile"]:
+        filt = KB_INDEX["monitors_by_profile"][profile]
+        return filt[rng.randrange(len(filt))]
     return min(monitors, key=lambda m: abs(m["price"] - budget * 0.1))
 
 def choose_psu(psus, gpu):
-    pwr = gpu.get("power_w", 100)
+    pwr = gpu["power_w"]
     if pwr <= 100:
         return psus[0]
     elif pwr <= 160:
@@ -91,102 +143,136 @@ def choose_psu(psus, gpu):
     else:
         return psus[-1]
 
-# -------------------- CONSTRUCCIÓN DE REGLAS --------------------
-def build_rules(engine: InferenceEngine, knowledge):
-    profiles = knowledge["profiles"]
-    comps = knowledge["components"]
-    alloc = knowledge["rules_meta"]["allocation_percentages"]
-
-    # Regla 1: detectar perfil según presupuesto
-    def cond_detect(f): return "detected_profile" not in f
-    def act_detect(f):
-        p = f.get("profile", "").lower()
-        b = f["budget"]
-        if p in profiles and p != "ninguno":
-            f["detected_profile"] = p
-        elif b < 10000: f["detected_profile"] = "ofimatico"
-        elif b < 20000: f["detected_profile"] = "estudiante"
-        elif b < 30000: f["detected_profile"] = "programador"
-        elif b < 40000: f["detected_profile"] = "gamer"
-        else: f["detected_profile"] = "disenador"
-
-    # Regla 2: elegir CPU
-    def cond_cpu(f): return "cpu" not in f and "detected_profile" in f
-    def act_cpu(f):
-        prof = f["detected_profile"]
-        f["cpu"] = choose_best(comps["cpus"], f["budget"], alloc[prof]["cpu"])
-
-    # Regla 3: elegir GPU
-    def cond_gpu(f): return "gpu" not in f and "detected_profile" in f
-    def act_gpu(f):
-        prof = f["detected_profile"]
-        pinfo = profiles[prof]
-        if not pinfo["gpu_required"]:
-            f["gpu"] = next((g for g in comps["gpus"] if g["level"] == "integrated"), comps["gpus"][0])
-        else:
-            f["gpu"] = choose_best(comps["gpus"], f["budget"], alloc[prof]["gpu"])
-
-    # Regla 4: RAM y SSD
-    def cond_mem(f): return "ram" not in f and "ssd" not in f and "detected_profile" in f
-    def act_mem(f):
-        prof = f["detected_profile"]
-        pinfo = profiles[prof]
-        f["ram"], f["ssd"] = choose_ram_and_ssd(comps["rams"], comps["ssds"], pinfo,
-                                                f["budget"], alloc[prof]["ram"], alloc[prof]["ssd"])
-
-    # Regla 5: Motherboard
-    def cond_mobo(f): return "motherboard" not in f and "cpu" in f
-    def act_mobo(f): f["motherboard"] = choose_mobo(comps["motherboards"], f["cpu"])
-
-    # Regla 6: PSU
-    def cond_psu(f): return "psu" not in f and "gpu" in f
-    def act_psu(f): f["psu"] = choose_psu(comps["psus"], f["gpu"])
-
-    # Regla 7: Monitor
-    def cond_mon(f): return "monitor" not in f and "detected_profile" in f
-    def act_mon(f): f["monitor"] = choose_monitor(comps["monitors"], f["detected_profile"], f["budget"])
-
-    # Añadir reglas al motor
-    engine.add_rule(cond_detect, act_detect, "detectar_perfil")
-    engine.add_rule(cond_cpu, act_cpu, "elegir_cpu")
-    engine.add_rule(cond_gpu, act_gpu, "elegir_gpu")
-    engine.add_rule(cond_mem, act_mem, "elegir_memoria")
-    engine.add_rule(cond_mobo, act_mobo, "elegir_motherboard")
-    engine.add_rule(cond_psu, act_psu, "elegir_fuente")
-    engine.add_rule(cond_mon, act_mon, "elegir_monitor")
+# -------------------- REGLAS --------------------
+# Cada regla es una función simple (facts, knowledge). El grafo de reglas es
+# estático, así que se construye una sola vez al importar el módulo y se
+# ejecuta en orden topológico: perfil -> CPU/GPU/memoria -> motherboard/PSU/monitor.
+
+# Umbrales de presupuesto (límite superior exclusivo) -> perfil deducido
+THRESHOLDS = (10000, 20000, 30000, 40000)
+PROFILE_BY_BUCKET = ("ofimatico", "estudiante", "programador", "gamer", "disenador")
+
+# Regla 1: detectar perfil según presupuesto
+def act_detect(f, k):
+    p = f.get("profile", "").lower()
+    b = f["budget"]
+    if p in k["profiles"] and p != "ninguno":
+        f["detected_profile"] = p
+    else:
+        f["detected_profile"] = PROFILE_BY_BUCKET[bisect_right(THRESHOLDS, b)]
+
+# Regla 2: elegir CPU
+def act_cpu(f, k):
+    prof = f["detected_profile"]
+    alloc = k["rules_meta"]["allocation_percentages"]
+    f["cpu"] = choose_best(KB_INDEX["cpus_sorted"], f["budget"], alloc[prof]["cpu"])
+
+# Regla 3: elegir GPU
+def act_gpu(f, k):
+    prof = f["detected_profile"]
+    if not k["profiles"][prof]["gpu_required"]:
+        f["gpu"] = KB_INDEX["integrated_gpu"]
+    else:
+        alloc = k["rules_meta"]["allocation_percentages"]
+        f["gpu"] = choose_best(KB_INDEX["gpus_sorted"], f["budget"], alloc[prof]["gpu"])
+
+# Regla 4: RAM y SSD
+def act_mem(f, k):
+    prof = f["detected_profile"]
+    alloc = k["rules_meta"]["allocation_percentages"]
+    f["ram"], f["ssd"] = choose_ram_and_ssd(k["profiles"][prof], f["budget"],
+                                            alloc[prof]["ram"], alloc[prof]["ssd"])
+
+# Regla 5: Motherboard
+def act_mobo(f, k): f["motherboard"] = choose_mobo(k["components"]["motherboards"], f["cpu"], f["rng"])
+
+# Regla 6: PSU
+def act_psu(f, k): f["psu"] = choose_psu(k["components"]["psus"], f["gpu"])
+
+# Regla 7: Monitor
+def act_mon(f, k): f["monitor"] = choose_monitor(k["components"]["monitors"], f["detected_profile"], f["budget"], f["rng"])
+
+RULES = (act_detect, act_cpu, act_gpu, act_mem, act_mobo, act_psu, act_mon)
+
+def compile_rules(rules):
+    """Genera una sola función que aplica las reglas en línea recta, sin bucle."""
+    body = "".join(f"    {fn.__name__}(f, k)\n" for fn in rules)
+    namespace = {fn.__name__: fn for fn in rules}
+    exec(compile(f"def run_rules(f, k):\n{body}", "<reglas>", "exec"), namespace)
+    return namespace["run_rules"]
+
+run_rules = compile_rules(RULES)
+
+# -------------------- MOTOR DE INFERENCIA --------------------
+class InferenceEngine:
+    def __init__(self, knowledge):
+        self.knowledge = knowledge
+        self.facts = {}
+
+    def add_fact(self, key, value):
+        self.facts[key] = value
+
+    def infer(self):
+        run_rules(self.facts, self.knowledge)
+        return self.facts
 
 # -------------------- ENDPOINT PRINCIPAL --------------------
+def recommendation_digest(profile, budget):
+    return hashlib.md5(f"{profile}:{budget}".encode()).hexdigest()
+
+COMPONENT_LABELS = (("CPU", "cpu"), ("GPU", "gpu"), ("RAM", "ram"), ("SSD", "ssd"),
+                    ("Motherboard", "motherboard"), ("PSU", "psu"), ("Monitor", "monitor"))
+
+@functools.lru_cache(maxsize=1024)
+def _compute(profile, budget, full=False):
+    """Ejecuta el motor para un perfil ya deducido. Determinista, por eso se memoriza."""
+    # Generador propio por petición: sin estado global compartido entre peticiones
+    rng = random.Random(int(recommendation_digest(profile, budget), 16))
+
+    engine = InferenceEngine(knowledge)
+    engine.add_fact("profile", profile)
+    engine.add_fact("budget", budget)
+    engine.add_fact("rng", rng)
+    facts = engine.infer()
+
+    prof = facts["detected_profile"]
+    total = sum(facts[c]["price"] for c in ["cpu","gpu","ram","ssd","motherboard","psu","monitor"])
+    alloc = knowledge["rules_meta"]["allocation_percentages"][prof]
+
+    return {
+        "profile": prof,
+        "budget_input": budget,
+        # Por omisión solo lo que muestra la UI; ?fields=full devuelve el componente completo
+        "components": {
+            label: facts[key] if full else {"id": facts[key]["id"], "name": facts[key]["name"], "price": facts[key]["price"]}
+            for label, key in COMPONENT_LABELS
+        },
+        "total_price_estimate": round(total, 2),
+        "exceeds_budget": total > budget,
+        "allocation_estimate": alloc,
+        "note": f"Perfil deducido automáticamente mediante motor de inferencia: {prof.upper()}."
+    }
+
 @app.post("/recommend")
-def recommend(req: UserRequest):
+async def recommend(req: UserRequest, request: Request, response: Response, fields: str = "") -> dict:
     try:
-        engine = InferenceEngine(knowledge)
-        engine.add_fact("profile", (req.profile or "").lower())
-        engine.add_fact("budget", float(req.budget))
-
-        build_rules(engine, knowledge)
-        facts = engine.infer()
+        budget = float(req.budget)
+        if budget < MIN_BASE:
+            return {**LOW_BUDGET_ERROR, "budget_input": req.budget}
 
+        facts = {"profile": (req.profile or "").lower(), "budget": budget}
+        act_detect(facts, knowledge)
         prof = facts["detected_profile"]
-        total = sum(facts[c]["price"] for c in ["cpu","gpu","ram","ssd","motherboard","psu","monitor"])
-        alloc = knowledge["rules_meta"]["allocation_percentages"][prof]
-
-        return {
-            "profile": prof,
-            "budget_input": req.budget,
-            "components": {
-                "CPU": facts["cpu"],
-                "GPU": facts["gpu"],
-                "RAM": facts["ram"],
-                "SSD": facts["ssd"],
-                "Motherboard": facts["motherboard"],
-                "PSU": facts["psu"],
-                "Monitor": facts["monitor"]
-            },
-            "total_price_estimate": round(total, 2),
-            "exceeds_budget": total > req.budget,
-            "allocation_estimate": alloc,
-            "note": f"Perfil deducido automáticamente mediante motor de inferencia: {prof.upper()}."
-        }
+
+        # ETag: mismo catálogo y misma entrada (perfil deducido, presupuesto) -> misma recomendación
+        full = fields == "full"
+        etag = f'"{KB_DIGEST}-{recommendation_digest(prof, budget)}{"-full" if full else ""}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        result = _compute(prof, budget, full)
+        response.headers["ETag"] = etag
+        return result
 
     except Exception as e:
         print("ERROR INTERNO:", traceback.format_exc())
@@ -196,3 +282,12 @@ def recommend(req: UserRequest):
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+# -------------------- EJECUCIÓN --------------------
+# El motor es CPU puro: se escala con un proceso por núcleo (cada worker
+# tiene su propio lru_cache). "auto" usa uvloop y httptools cuando están
+# instalados (pip install "uvicorn[standard]").
+if __name__ == "__main__":
+    import os, uvicorn
+    uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=os.cpu_count(),
+                loop="auto", http="auto", log_level="warning")